@@ -1,3 +1,5 @@
+import os
+import sys
 import geopandas as gpd
 import matplotlib.pyplot as plt
 from mpl_toolkits.axes_grid1 import make_axes_locatable
@@ -5,20 +7,29 @@ from cartopy.feature import ShapelyFeature
 import cartopy.crs as ccrs
 import matplotlib.patches as mpatches
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # so that we can import stage_timer
+from stage_timer import stage, report, vertices
+
 
 # ---------------------------------------------------------------------------------------------------------------------
 # in this section, write the script to load the data and complete the main part of the analysis.
 # try to print the results to the screen using the format method demonstrated in the workbook
 
 # load the necessary data here and transform to a UTM projection
-counties = gpd.read_file('data_files/Counties.shp') # load the counties shapefile
-counties.to_crs(epsg=32629, inplace=True) # transform to UTM projection
+with stage('load data') as rec:
+    counties = gpd.read_file('data_files/Counties.shp') # load the counties shapefile
+    wards = gpd.read_file('data_files/NI_Wards.shp') # load the counties shapefile
+    rec['rows'] = len(counties) + len(wards)
 
-wards = gpd.read_file('data_files/NI_Wards.shp') # load the counties shapefile
-wards.to_crs(epsg=32629, inplace=True) # transform to UTM projection
+with stage('to_crs', rows=len(counties) + len(wards)) as rec:
+    counties.to_crs(epsg=32629, inplace=True) # transform to UTM projection
+    wards.to_crs(epsg=32629, inplace=True) # transform to UTM projection
+    rec['vertices'] = vertices(counties, wards)
 
 # your analysis goes here...
-join = gpd.sjoin(counties, wards, how='inner', lsuffix='left', rsuffix='right') # perform the spatial join
+with stage('sjoin') as rec:
+    join = gpd.sjoin(counties, wards, how='inner', lsuffix='left', rsuffix='right') # perform the spatial join
+    rec['rows'] = len(join)
 
 # make print output look nicer
 pop_sum_counties = join.groupby(['CountyName'], as_index=False)['Population'].sum() # summarise population per county
@@ -51,35 +62,37 @@ print('Of all counties, {} has the lowest population with {} residents'.format(c
 
 # ---------------------------------------------------------------------------------------------------------------------
 # below here, you may need to modify the script somewhat to create your map.
-# create a crs using ccrs.UTM() that corresponds to our CRS
-myCRS = ccrs.UTM(29)
-# create a figure of size 10x10 (representing the page size in inches
-fig, ax = plt.subplots(1, 1, figsize=(10, 10), subplot_kw=dict(projection=myCRS))
+with stage('draw map', rows=len(wards)):
+    # create a crs using ccrs.UTM() that corresponds to our CRS
+    myCRS = ccrs.UTM(29)
+    # create a figure of size 10x10 (representing the page size in inches
+    fig, ax = plt.subplots(1, 1, figsize=(10, 10), subplot_kw=dict(projection=myCRS))
 
-# add gridlines below
-gridlines = ax.gridlines(draw_labels=True,
-                         xlocs=[-8, -7.5, -7, -6.5, -6, -5.5],
-                         ylocs=[54, 54.5, 55, 55.5])
-gridlines.right_labels = False
-gridlines.bottom_labels = False
+    # add gridlines below
+    gridlines = ax.gridlines(draw_labels=True,
+                             xlocs=[-8, -7.5, -7, -6.5, -6, -5.5],
+                             ylocs=[54, 54.5, 55, 55.5])
+    gridlines.right_labels = False
+    gridlines.bottom_labels = False
 
-# to make a nice colorbar that stays in line with our map, use these lines:
-divider = make_axes_locatable(ax)
-cax = divider.append_axes("right", size="5%", pad=0.1, axes_class=plt.Axes)
+    # to make a nice colorbar that stays in line with our map, use these lines:
+    divider = make_axes_locatable(ax)
+    cax = divider.append_axes("right", size="5%", pad=0.1, axes_class=plt.Axes)
 
-# plot the ward data into our axis, using
-ward_plot = wards.plot(column='Population', ax=ax, vmin=1000, vmax=8000, cmap='viridis',
-                       legend=True, cax=cax, legend_kwds={'label': 'Resident Population'})
+    # plot the ward data into our axis, using
+    ward_plot = wards.plot(column='Population', ax=ax, vmin=1000, vmax=8000, cmap='viridis',
+                           legend=True, cax=cax, legend_kwds={'label': 'Resident Population'})
 
-county_outlines = ShapelyFeature(counties['geometry'], myCRS, edgecolor='r', facecolor='none')
+    county_outlines = ShapelyFeature(counties['geometry'], myCRS, edgecolor='r', facecolor='none')
 
-ax.add_feature(county_outlines)
-county_handles = [mpatches.Rectangle((0, 0), 1, 1, facecolor='none', edgecolor='r')]
+    ax.add_feature(county_outlines)
+    county_handles = [mpatches.Rectangle((0, 0), 1, 1, facecolor='none', edgecolor='r')]
 
-ax.legend(county_handles, ['County Boundaries'], fontsize=12, loc='upper left', framealpha=1)
+    ax.legend(county_handles, ['County Boundaries'], fontsize=12, loc='upper left', framealpha=1)
 
 # save the figure
-fig.savefig('sample_map.png', dpi=300, bbox_inches='tight')
+with stage('savefig'):
+    fig.savefig('sample_map.png', dpi=300, bbox_inches='tight')
 
 
 # ---------------------------------------------------------------------------------------------------------------------
@@ -128,15 +141,18 @@ print('Of all wards, {} has the lowest population with {} residents'.format(wpmi
 # Repeat the exercise above using the script but this time use the population density
 # (in number of residents per square km)
 
-for ind, row in wards.iterrows():  # iterate over each row in the GeoDataFrame
-    wards.loc[ind, 'Areakm2'] = row['geometry'].area/1000000  # assign the row's geometry area to a new column Areakm2
+with stage('ward density (iterrows)', rows=len(wards)):
+    for ind, row in wards.iterrows():  # iterate over each row in the GeoDataFrame
+        wards.loc[ind, 'Areakm2'] = row['geometry'].area/1000000  # assign the row's geometry area to a new column Areakm2
 
-for ind, row in wards.iterrows():  # iterate over each row in the GeoDataFrame
-    wards.loc[ind, 'PopDensity'] = row['Population']/row['Areakm2']  # assign the population density as
-                                                                     # population/areakm2 to a new column PopDensity
+    for ind, row in wards.iterrows():  # iterate over each row in the GeoDataFrame
+        wards.loc[ind, 'PopDensity'] = row['Population']/row['Areakm2']  # assign the population density as
+                                                                         # population/areakm2 to a new column PopDensity
 
-joinpd = gpd.sjoin(counties, wards, how='inner', lsuffix='left', rsuffix='right')
-                                                                     # new spatial join for populaion density
+with stage('sjoin (density)') as rec:
+    joinpd = gpd.sjoin(counties, wards, how='inner', lsuffix='left', rsuffix='right')
+                                                                         # new spatial join for populaion density
+    rec['rows'] = len(joinpd)
 
 counties_pop_sum = joinpd.groupby(['CountyName'], as_index=False)['Population'].sum() # summarise population per county
                                                                                       # output as GeoDataFrame
@@ -216,32 +232,36 @@ print('Of all wards, {} has the lowest population density with {:.2f} residents
 
 # ---------------------------------------------------------------------------------------------------------------------
 # below here, you may need to modify the script somewhat to create your map.
-# create a crs using ccrs.UTM() that corresponds to our CRS
-myCRS = ccrs.UTM(29)
-# create a figure of size 10x10 (representing the page size in inches
-fig, ax = plt.subplots(1, 1, figsize=(10, 10), subplot_kw=dict(projection=myCRS))
+with stage('draw density map', rows=len(wards)):
+    # create a crs using ccrs.UTM() that corresponds to our CRS
+    myCRS = ccrs.UTM(29)
+    # create a figure of size 10x10 (representing the page size in inches
+    fig, ax = plt.subplots(1, 1, figsize=(10, 10), subplot_kw=dict(projection=myCRS))
 
-# add gridlines below
-gridlines = ax.gridlines(draw_labels=True,
-                         xlocs=[-8, -7.5, -7, -6.5, -6, -5.5],
-                         ylocs=[54, 54.5, 55, 55.5])
-gridlines.right_labels = False
-gridlines.bottom_labels = False
+    # add gridlines below
+    gridlines = ax.gridlines(draw_labels=True,
+                             xlocs=[-8, -7.5, -7, -6.5, -6, -5.5],
+                             ylocs=[54, 54.5, 55, 55.5])
+    gridlines.right_labels = False
+    gridlines.bottom_labels = False
 
-# to make a nice colorbar that stays in line with our map, use these lines:
-divider = make_axes_locatable(ax)
-cax = divider.append_axes("right", size="5%", pad=0.1, axes_class=plt.Axes)
+    # to make a nice colorbar that stays in line with our map, use these lines:
+    divider = make_axes_locatable(ax)
+    cax = divider.append_axes("right", size="5%", pad=0.1, axes_class=plt.Axes)
 
-# plot the ward data into our axis, using
-ward_plot = wards.plot(column='PopDensity', ax=ax, vmin=0, vmax=10000, cmap='viridis',
-                       legend=True, cax=cax, legend_kwds={'label': 'Population Density'})
+    # plot the ward data into our axis, using
+    ward_plot = wards.plot(column='PopDensity', ax=ax, vmin=0, vmax=10000, cmap='viridis',
+                           legend=True, cax=cax, legend_kwds={'label': 'Population Density'})
 
-county_outlines = ShapelyFeature(counties['geometry'], myCRS, edgecolor='r', facecolor='none')
+    county_outlines = ShapelyFeature(counties['geometry'], myCRS, edgecolor='r', facecolor='none')
 
-ax.add_feature(county_outlines)
-county_handles = [mpatches.Rectangle((0, 0), 1, 1, facecolor='none', edgecolor='r')]
+    ax.add_feature(county_outlines)
+    county_handles = [mpatches.Rectangle((0, 0), 1, 1, facecolor='none', edgecolor='r')]
 
-ax.legend(county_handles, ['County Boundaries'], fontsize=12, loc='upper left', framealpha=1)
+    ax.legend(county_handles, ['County Boundaries'], fontsize=12, loc='upper left', framealpha=1)
 
 # save the figure
-fig.savefig('sample_map_pd.png', dpi=300, bbox_inches='tight')
\ No newline at end of file
+with stage('savefig (density)'):
+    fig.savefig('sample_map_pd.png', dpi=300, bbox_inches='tight')
+
+report('exercise_trace.json')
@@ -0,0 +1,626 @@
+'''
+Benchmarks for the workflows in this repository, run over the NI datasets that come with the practicals.
+
+Most benchmarks are also run on synthetic, upscaled copies of the data (x10, x100 features/pixels), so that
+we can see how each operation scales. Results are saved as JSON files in benchmarks/results, and can be compared
+against a stored baseline:
+
+    python benchmarks/run_benchmarks.py --save baseline
+    python benchmarks/run_benchmarks.py --compare baseline
+
+Benchmarks whose input data are not present are skipped.
+'''
+import os
+import sys
+import atexit
+import json
+import time
+import shutil
+import runpy
+import subprocess
+import platform
+import argparse
+import tempfile
+import statistics
+from contextlib import contextmanager
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import stage_timer
+from stage_timer import StageTimer
+from map_tools import percentile_stretch, img_display, count_unique, landcover_names, landcover_table
+from grid_binning import bin_points, bin_raster
+from spatial_layout import write_sorted, read_extent
+
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+ROADS = os.path.join(ROOT, 'Week3', 'data_files', 'NI_roads.shp')
+WARDS = os.path.join(ROOT, 'Week3', 'data_files', 'NI_Wards.shp')
+COUNTIES = os.path.join(ROOT, 'Week3', 'data_files', 'Counties.shp')
+STATIONS = os.path.join(ROOT, 'Week3', 'data_files', 'translink-stationsni.csv')
+LANDCOVER = os.path.join(ROOT, 'Week5', 'data_files', 'LCM2015_Aggregate_100m.tif')
+
+BENCHMARKS = []
+
+
+class Skip(Exception):
+    '''
+    Raised by a benchmark setup when it can't be run (e.g., because the input data are missing).
+    '''
+
+
+def benchmark(name, scales=(1, 10, 100)):
+    '''
+    Register a benchmark.
+
+    The decorated function does the setup for one scale factor, and returns a function with no arguments that
+    runs the operation to be timed.
+
+    :param name: the name of the benchmark
+    :param scales: the scale factors that the benchmark can be run at
+    '''
+    def decorator(setup):
+        BENCHMARKS.append({'name': name, 'scales': scales, 'setup': setup})
+        return setup
+    return decorator
+
+
+def require(*fns):
+    '''
+    Skip the benchmark if any of the given files do not exist.
+    '''
+    for fn in fns:
+        if not os.path.exists(fn):
+            raise Skip('{} not found'.format(os.path.relpath(fn, ROOT)))
+
+
+def scratch_dir():
+    '''
+    Create a temporary folder for benchmark files, which is removed when the benchmarks finish.
+    '''
+    workdir = tempfile.mkdtemp(prefix='egm722_bench_')
+    atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+    return workdir
+
+
+def tile_shape(scale):
+    '''
+    Split a scale factor into a (rows, columns) layout for tiling copies of a dataset, e.g. 10 -> (2, 5).
+    '''
+    nrows = int(np.sqrt(scale))
+    while scale % nrows:
+        nrows -= 1
+    return nrows, scale // nrows
+
+
+def tile_gdf(gdf, scale, dx=None, dy=None):
+    '''
+    Upscale a GeoDataFrame by laying out scale translated copies of it side by side.
+
+    :param gdf: the GeoDataFrame to copy
+    :param scale: the number of copies to make
+    :param dx: the x offset between columns of copies. If None, the width of the GeoDataFrame is used.
+    :param dy: the y offset between rows of copies. If None, the height of the GeoDataFrame is used.
+
+    :returns: the upscaled GeoDataFrame
+    '''
+    import pandas as pd
+    import geopandas as gpd
+
+    if scale == 1:
+        return gdf
+    xmin, ymin, xmax, ymax = gdf.total_bounds
+    dx = xmax - xmin if dx is None else dx
+    dy = ymax - ymin if dy is None else dy
+    _, ncols = tile_shape(scale)
+
+    tiles = []
+    for ii in range(scale):
+        row, col = divmod(ii, ncols)
+        tile = gdf.copy()
+        tile['geometry'] = gdf.geometry.translate(xoff=col * dx, yoff=row * dy)
+        tiles.append(tile)
+    return gpd.GeoDataFrame(pd.concat(tiles, ignore_index=True), crs=gdf.crs)
+
+
+def tile_array(arr, scale):
+    '''
+    Upscale a 2-dimensional array by tiling scale copies of it.
+    '''
+    return np.tile(arr, tile_shape(scale))
+
+
+def read_landcover():
+    '''
+    Read the LCM2015 landcover raster, returning the array, the affine transformation, and the CRS.
+    '''
+    import rasterio as rio
+
+    require(LANDCOVER)
+    with rio.open(LANDCOVER) as dataset:
+        return dataset.read(1), dataset.transform, dataset.crs
+
+
+def synthetic_mosaic(scale, size=300, seed=722):
+    '''
+    Create a random 3-band uint16 "mosaic", with scale * size**2 pixels per band.
+    '''
+    rng = np.random.default_rng(seed)
+    nrows, ncols = tile_shape(scale)
+    return rng.gamma(2, 500, size=(3, size * nrows, size * ncols)).astype(np.uint16)
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# the benchmarks themselves
+@benchmark('load roads', scales=(1,))
+def load_roads(scale):
+    import geopandas as gpd
+
+    require(ROADS)
+    return lambda: gpd.read_file(ROADS)
+
+
+@benchmark('load wards', scales=(1,))
+def load_wards(scale):
+    import geopandas as gpd
+
+    require(WARDS)
+    return lambda: gpd.read_file(WARDS)
+
+
+@benchmark('reproject roads to ITM')
+def reproject_roads(scale):
+    import geopandas as gpd
+
+    require(ROADS)
+    roads = tile_gdf(gpd.read_file(ROADS), scale)
+    return lambda: roads.to_crs(epsg=2157)
+
+
+@benchmark('reproject wards to UTM')
+def reproject_wards(scale):
+    import geopandas as gpd
+
+    require(WARDS)
+    wards = tile_gdf(gpd.read_file(WARDS), scale)
+    return lambda: wards.to_crs(epsg=32629)
+
+
+@benchmark('sjoin counties/wards')
+def sjoin_counties_wards(scale):
+    import geopandas as gpd
+
+    require(COUNTIES, WARDS)
+    counties = tile_gdf(gpd.read_file(COUNTIES).to_crs(epsg=32629), scale)
+    wards = tile_gdf(gpd.read_file(WARDS).to_crs(epsg=32629), scale)
+    return lambda: gpd.sjoin(counties, wards, how='inner', lsuffix='left', rsuffix='right')
+
+
+@benchmark('clip roads by county', scales=(1, 10))
+def clip_roads(scale):
+    import geopandas as gpd
+
+    require(COUNTIES, ROADS)
+    counties = tile_gdf(gpd.read_file(COUNTIES).to_crs(epsg=2157), scale)
+    roads = tile_gdf(gpd.read_file(ROADS).to_crs(epsg=2157), scale)
+
+    def run():
+        # as in Week3/Practical3.ipynb, but with the length/county name assigned as columns
+        clipped = []
+        for county in counties['CountyName'].unique():
+            tmp_clip = gpd.clip(roads, counties[counties['CountyName'] == county])
+            tmp_clip['Length'] = tmp_clip.length
+            tmp_clip['CountyName'] = county
+            clipped.append(tmp_clip)
+        return clipped
+    return run
+
+
+def roads_files(scale):
+    '''
+    Write the (upscaled) roads as a shapefile, and in Hilbert order as GeoParquet and FlatGeobuf, and get a mask
+    to read: the first county, or a box around Belfast if Counties.shp is not available.
+    '''
+    import shapely
+    import geopandas as gpd
+
+    require(ROADS)
+    workdir = scratch_dir()
+    roads = tile_gdf(gpd.read_file(ROADS), scale)
+
+    fn_shp = os.path.join(workdir, 'NI_roads.shp')
+    roads.to_file(fn_shp)
+    write_sorted(roads, os.path.join(workdir, 'NI_roads.parquet'))
+    write_sorted(roads, os.path.join(workdir, 'NI_roads.fgb'))
+
+    if os.path.exists(COUNTIES):
+        mask = gpd.read_file(COUNTIES).to_crs(roads.crs).iloc[[0]]
+    else:
+        mask = gpd.GeoDataFrame(geometry=[shapely.box(-6.1, 54.5, -5.8, 54.7)], crs='epsg:4326').to_crs(roads.crs)
+    return workdir, mask
+
+
+@benchmark('county roads (full read + clip)', scales=(1, 10))
+def county_roads_full(scale):
+    import geopandas as gpd
+
+    workdir, mask = roads_files(scale)
+    return lambda: gpd.clip(gpd.read_file(os.path.join(workdir, 'NI_roads.shp')), mask)
+
+
+@benchmark('county roads (windowed parquet + clip)', scales=(1, 10))
+def county_roads_parquet(scale):
+    import geopandas as gpd
+
+    workdir, mask = roads_files(scale)
+    return lambda: gpd.clip(read_extent(os.path.join(workdir, 'NI_roads.parquet'), mask=mask), mask)
+
+
+@benchmark('county roads (windowed fgb + clip)', scales=(1, 10))
+def county_roads_fgb(scale):
+    import geopandas as gpd
+
+    workdir, mask = roads_files(scale)
+    return lambda: gpd.clip(read_extent(os.path.join(workdir, 'NI_roads.fgb'), mask=mask), mask)
+
+
+def station_points(scale, npts=500, seed=722):
+    '''
+    Load the train/bus stations, and create random query points (in place of ward centroids) over NI.
+    '''
+    import pandas as pd
+    import geopandas as gpd
+
+    require(STATIONS)
+    df = pd.read_csv(STATIONS)
+    stations = gpd.GeoDataFrame(df[['Station', 'Type']], geometry=gpd.points_from_xy(df['Easting'], df['Northing']),
+                                crs='epsg:29902').to_crs(epsg=2157)
+
+    rng = np.random.default_rng(seed)
+    xmin, ymin, xmax, ymax = stations.total_bounds
+    query = gpd.GeoDataFrame(geometry=gpd.points_from_xy(rng.uniform(xmin, xmax, npts * scale),
+                                                         rng.uniform(ymin, ymax, npts * scale)), crs=stations.crs)
+    return stations, query
+
+
+@benchmark('nearest station (loop)', scales=(1, 10))
+def nearest_station_loop(scale):
+    stations, query = station_points(scale)
+
+    def run():
+        # the same approach as Week3/setup/aggregate_data.py. we write to a copy, so that every run has to create
+        # the new columns, rather than only the first one
+        nearest = query.copy()
+        for ind, row in nearest.iterrows():
+            distances = stations.distance(row['geometry'])
+            min_ind = distances.argmin()
+            nearest.loc[ind, 'NearestStation'] = stations.iloc[min_ind].Station.title()
+            nearest.loc[ind, 'Distance'] = distances.min() / 1000
+    return run
+
+
+@benchmark('nearest station (sjoin_nearest)')
+def nearest_station_sjoin(scale):
+    import geopandas as gpd
+
+    stations, query = station_points(scale)
+    return lambda: gpd.sjoin_nearest(query, stations, distance_col='Distance')
+
+
+@benchmark('count_unique landcover')
+def landcover_count_unique(scale):
+    landcover, _, _ = read_landcover()
+    landcover = tile_array(landcover, scale)
+    return lambda: count_unique(landcover, landcover_names)
+
+
+@benchmark('zonal stats landcover', scales=(1, 10))
+def landcover_zonal_stats(scale):
+    import geopandas as gpd
+    import rasterstats
+
+    landcover, affine_tfm, crs = read_landcover()
+    require(COUNTIES)
+    counties = gpd.read_file(COUNTIES).to_crs(crs)
+
+    # the tiled raster grows to the right and downwards from the same upper left corner, so we lay out
+    # the copies of the counties in the same way
+    nrows, ncols = landcover.shape
+    counties = tile_gdf(counties, scale, dx=ncols * affine_tfm.a, dy=nrows * affine_tfm.e)
+    landcover = tile_array(landcover, scale)
+
+    return lambda: rasterstats.zonal_stats(counties, landcover, affine=affine_tfm, categorical=True,
+                                           category_map=landcover_names, nodata=0)
+
+
+def synthetic_zone_stats(scale, nzones=100, seed=722):
+    '''
+    Create random categorical zonal stats (as from rasterstats.zonal_stats()), with some classes missing per zone.
+    '''
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(0, 5000, size=(nzones * scale, len(landcover_names)))
+    counts[rng.random(counts.shape) < 0.2] = 0
+    names = list(landcover_names.values())
+    return [{names[ii]: int(c) for ii, c in enumerate(row) if c > 0} for row in counts]
+
+
+@benchmark('landcover table (loop)', scales=(1, 10))
+def landcover_table_loop(scale):
+    import pandas as pd
+
+    zone_stats = synthetic_zone_stats(scale)
+    zones = pd.DataFrame({'Zone': range(len(zone_stats))})
+
+    def run():
+        # as in Week5/Practical5.ipynb, on a copy so that every run has to create the new columns
+        table = zones.copy()
+        for ind, row in table.iterrows():
+            for name in landcover_names.values():
+                try:
+                    table.loc[ind, name] = zone_stats[ind][name]
+                except KeyError:
+                    table.loc[ind, name] = 0
+        cols = list(landcover_names.values())
+        for ind, row in table.iterrows():
+            table.loc[ind, cols] = 100 * row[cols] / row[cols].sum()
+    return run
+
+
+@benchmark('landcover table (vectorized)')
+def landcover_table_vectorized(scale):
+    from affine import Affine
+
+    zone_stats = synthetic_zone_stats(scale)
+    return lambda: landcover_table(zone_stats, landcover_names, affine_tfm=Affine(100, 0, 0, 0, -100, 0))
+
+
+@benchmark('grid binning points (sjoin)', scales=(1, 10))
+def grid_points_sjoin(scale, size=250):
+    import shapely
+    import geopandas as gpd
+
+    _, query = station_points(scale)
+    xmin, ymin, xmax, ymax = query.total_bounds
+    xx, yy = np.meshgrid(np.arange(xmin, xmax, size), np.arange(ymin, ymax, size))
+    grid = gpd.GeoDataFrame(geometry=shapely.box(xx.ravel(), yy.ravel(), xx.ravel() + size, yy.ravel() + size),
+                            crs=query.crs)
+
+    def run():
+        # the polygon grid approach, as with the wards in Week3/exercise_script.py
+        return gpd.sjoin(grid, query, how='inner').groupby(level=0)['index_right'].count()
+    return run
+
+
+@benchmark('grid binning points (arithmetic)')
+def grid_points_arithmetic(scale, size=250):
+    _, query = station_points(scale)
+    return lambda: bin_points(query, size, kind='square')
+
+
+@benchmark('grid binning landcover (hex)', scales=(1, 10))
+def grid_landcover(scale, size=1000):
+    landcover, affine_tfm, _ = read_landcover()
+    landcover = tile_array(landcover, scale)
+    return lambda: bin_raster(landcover, affine_tfm, size, landcover_names, kind='hex')
+
+
+@benchmark('percentile_stretch mosaic')
+def stretch_mosaic(scale):
+    img = synthetic_mosaic(scale)
+    return lambda: percentile_stretch(img[0], pmin=0.1, pmax=99.9)
+
+
+@benchmark('img_display mosaic')
+def display_mosaic(scale):
+    import matplotlib.pyplot as plt
+
+    img = synthetic_mosaic(scale)
+
+    def run():
+        fig, ax = plt.subplots(1, 1)
+        img_display(img, ax, [2, 1, 0], stretch_args={'pmin': 0.1, 'pmax': 99.9})
+        plt.close('all')  # so that figures from earlier runs don't add to the memory and time of later ones
+    return run
+
+
+@benchmark('render practical2_script.py', scales=(1,))
+def render_practical2(scale):
+    import matplotlib.pyplot as plt
+
+    week2 = os.path.join(ROOT, 'Week2')
+    require(*[os.path.join(week2, 'data_files', name + '.shp')
+              for name in ['NI_outline', 'Towns', 'Water', 'Rivers', 'Counties']])
+
+    # run the script in a temporary folder, so that we don't overwrite Week2/map.png
+    workdir = scratch_dir()
+    shutil.copytree(os.path.join(week2, 'data_files'), os.path.join(workdir, 'data_files'))
+
+    def run():
+        with chdir(workdir):
+            runpy.run_path(os.path.join(week2, 'practical2_script.py'), run_name='__main__')
+        plt.close('all')  # the script never closes its (300 dpi) figure
+    return run
+
+
+@benchmark('cli startup', scales=(1,))
+def cli_startup(scale):
+    cmd = [sys.executable, os.path.join(ROOT, 'egm722_cli.py'), '--help']
+    return lambda: subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+
+
+@benchmark('eager imports', scales=(1,))
+def eager_imports(scale):
+    # what each of the scripts pays at startup, before any work begins
+    cmd = [sys.executable, '-c', 'import geopandas, cartopy.crs, matplotlib.pyplot, rasterio, shapely']
+    return lambda: subprocess.run(cmd, check=True, env=dict(os.environ, MPLBACKEND='Agg'))
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# running the benchmarks and comparing the results
+@contextmanager
+def chdir(path):
+    '''
+    Temporarily change the working directory.
+    '''
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+
+
+def run_benchmark(bench, scale, repeat=5, min_time=1.):
+    '''
+    Set up and time one benchmark at one scale.
+
+    The operation is run at least once, and then repeated until it has run repeat times or for min_time seconds,
+    whichever comes first.
+
+    :param bench: the benchmark, as registered by benchmark()
+    :param scale: the scale factor to run the benchmark at
+    :param repeat: the maximum number of times to run the operation
+    :param min_time: the time, in seconds, after which to stop repeating the operation
+
+    :returns: a dict of the timing results
+    '''
+    name = '{} x{}'.format(bench['name'], scale)
+    try:
+        func = bench['setup'](scale)
+    except Skip as e:
+        return {'name': bench['name'], 'scale': scale, 'skipped': str(e)}
+
+    timer = StageTimer()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        with timer.stage(name):
+            func()
+        if time.perf_counter() - start > min_time:
+            break
+
+    walls = [rec['wall'] for rec in timer.records]
+    return {'name': bench['name'], 'scale': scale, 'runs': len(walls),
+            'min': min(walls), 'median': statistics.median(walls),
+            'cpu': statistics.median([rec['cpu'] for rec in timer.records]),
+            'peak_rss_delta': max([rec['peak_rss_delta'] or 0 for rec in timer.records])}
+
+
+def machine_info():
+    '''
+    Get a description of the machine/environment that the benchmarks were run on.
+    '''
+    info = {'platform': platform.platform(), 'machine': platform.machine(), 'cpus': os.cpu_count(),
+            'python': platform.python_version(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    for package in ['numpy', 'pandas', 'shapely', 'pyproj', 'geopandas', 'rasterio', 'matplotlib', 'cartopy']:
+        try:
+            info[package] = __import__(package).__version__
+        except ImportError:
+            info[package] = None
+    return info
+
+
+def result_key(res):
+    '''
+    Get the name of a result, e.g. 'reproject roads to ITM x10'.
+    '''
+    return '{} x{}'.format(res['name'], res['scale'])
+
+
+def print_results(results, stream=sys.stdout):
+    '''
+    Print a table of benchmark results, with a scaling column relative to the x1 result for the same benchmark.
+    '''
+    base = {res['name']: res['median'] for res in results if res['scale'] == 1 and 'skipped' not in res}
+
+    print('{:<45}{:>6}{:>12}{:>12}{:>12}{:>10}'.format('benchmark', 'runs', 'min (s)', 'median (s)', 'rss (MB)',
+                                                      'vs x1'), file=stream)
+    for res in results:
+        if 'skipped' in res:
+            print('{:<45}  skipped: {}'.format(result_key(res), res['skipped']), file=stream)
+            continue
+        scaling = '-'
+        if res['name'] in base and base[res['name']] > 0:
+            scaling = '{:.1f}x'.format(res['median'] / base[res['name']])
+        print('{:<45}{:>6}{:>12.4f}{:>12.4f}{:>12.1f}{:>10}'.format(result_key(res), res['runs'], res['min'],
+                                                                    res['median'], res['peak_rss_delta'] / 2**20,
+                                                                    scaling), file=stream)
+
+
+def compare(results, baseline, threshold=1.2, stream=sys.stdout):
+    '''
+    Compare a set of results against a baseline, and print a report.
+
+    :param results: the list of results to compare
+    :param baseline: the list of baseline results
+    :param threshold: the ratio of the median times above which a result is counted as a regression
+    :param stream: where to print the report
+
+    :returns: the number of regressions
+    '''
+    old = {result_key(res): res for res in baseline if 'skipped' not in res}
+    nregress = 0
+
+    print('{:<45}{:>14}{:>14}{:>10}'.format('benchmark', 'baseline (s)', 'current (s)', 'ratio'), file=stream)
+    for res in results:
+        key = result_key(res)
+        if 'skipped' in res or key not in old:
+            continue
+        ratio = res['median'] / old[key]['median']
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            nregress += 1
+        elif ratio < 1 / threshold:
+            flag = '  improved'
+        print('{:<45}{:>14.4f}{:>14.4f}{:>9.2f}x{}'.format(key, old[key]['median'], res['median'], ratio, flag),
+              file=stream)
+
+    print('\n{} regression(s) above {:.2f}x'.format(nregress, threshold), file=stream)
+    return nregress
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the benchmarks for the EGM722 workflows.')
+    parser.add_argument('-k', '--filter', default=None, help='only run benchmarks whose name contains this string')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='the scale factors to run')
+    parser.add_argument('--repeat', type=int, default=5, help='the maximum number of runs per benchmark')
+    parser.add_argument('--min-time', type=float, default=1., help='stop repeating a benchmark after this many s')
+    parser.add_argument('--save', default=None, help='save the results to benchmarks/results/<SAVE>.json')
+    parser.add_argument('--compare', default=None, help='compare against benchmarks/results/<COMPARE>.json')
+    parser.add_argument('--threshold', type=float, default=1.2, help='slowdown ratio that counts as a regression')
+    args = parser.parse_args()
+
+    import matplotlib
+    matplotlib.use('Agg')  # we never want to show any of the figures
+
+    stage_timer.TIMER.enabled = False  # don't print stage summaries from the scripts that we run
+
+    results = []
+    for bench in BENCHMARKS:
+        if args.filter is not None and args.filter not in bench['name']:
+            continue
+        for scale in [s for s in args.scales if s in bench['scales']]:
+            print('running {} x{}'.format(bench['name'], scale), file=sys.stderr)
+            results.append(run_benchmark(bench, scale, repeat=args.repeat, min_time=args.min_time))
+
+    print_results(results)
+
+    if args.save is not None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        with open(os.path.join(RESULTS_DIR, args.save + '.json'), 'w') as f:
+            json.dump({'machine': machine_info(), 'results': results}, f, indent=2)
+
+    if args.compare is not None:
+        with open(os.path.join(RESULTS_DIR, args.compare + '.json'), 'r') as f:
+            baseline = json.load(f)
+        print()
+        if compare(results, baseline['results'], threshold=args.threshold) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
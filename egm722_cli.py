@@ -0,0 +1,308 @@
+'''
+A command-line entry point for the map and analysis workflows from the practicals.
+
+    python egm722_cli.py map map.png --outline Week2/data_files/NI_outline.shp --layer Week2/data_files/Towns.shp
+    python egm722_cli.py zonal Week5/data_files/LCM2015_Aggregate_100m.tif --zones Week2/data_files/Counties.shp
+    python egm722_cli.py nearest wards.shp Week3/data_files/translink-stationsni.csv --out nearest.csv
+    python egm722_cli.py stretch NI_Mosaic.tif mosaic.png --bands 2 1 0
+    python egm722_cli.py --batch jobs.txt
+
+The heavy packages (geopandas, cartopy, matplotlib, rasterio, rasterstats) are only imported once a subcommand
+needs them, so starting the program is quick. With --batch, each line of the jobs file is run as a separate
+subcommand in the same interpreter, so those imports only happen once for all of the jobs.
+'''
+import os
+import sys
+import shlex
+import argparse
+
+from stage_timer import stage, report
+
+# we never show figures on the screen, so use a backend that doesn't need a display (unless one has been chosen)
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+
+def read_layer(fn, x='Easting', y='Northing', crs='epsg:29902'):
+    '''
+    Read a vector layer, or a CSV/text file of point locations.
+
+    :param fn: the filename of the layer to read
+    :param x: the name of the x coordinate column, if fn is a CSV
+    :param y: the name of the y coordinate column, if fn is a CSV
+    :param crs: the CRS of the coordinates, if fn is a CSV
+
+    :returns: a GeoDataFrame of the features in the layer
+    '''
+    if os.path.splitext(fn)[1].lower() in ['.csv', '.txt']:
+        from point_ingest import read_points
+        return read_points(fn, x=x, y=y, crs=crs)
+
+    import geopandas as gpd
+    return gpd.read_file(fn)
+
+
+def run_map(args):
+    '''
+    Draw a map of one or more vector layers over an outline, with a legend and a scale bar.
+    '''
+    import matplotlib.pyplot as plt
+    import matplotlib.lines as mlines
+    import cartopy.crs as ccrs
+    from cartopy.feature import ShapelyFeature
+    from map_tools import generate_handles, scale_bar
+
+    myCRS = ccrs.UTM(args.utm_zone)
+    epsg = 32600 + args.utm_zone
+
+    with stage('map: load data') as rec:
+        outline = read_layer(args.outline).to_crs(epsg=epsg)
+        layers = [read_layer(fn).to_crs(epsg=epsg) for fn in args.layer]
+        rec['rows'] = len(outline) + sum(len(layer) for layer in layers)
+
+    fig = plt.figure(figsize=(10, 10))
+    try:  # close the figure even if the job fails, so that --batch runs don't build up open figures
+        with stage('map: draw features'):
+            ax = plt.axes(projection=myCRS)
+
+            ax.add_feature(ShapelyFeature(outline['geometry'], myCRS, edgecolor='k', facecolor='w'))
+            xmin, ymin, xmax, ymax = outline.total_bounds
+            ax.set_extent([xmin-5000, xmax+5000, ymin-5000, ymax+5000], crs=myCRS)
+
+            labels = args.labels or [os.path.splitext(os.path.basename(fn))[0] for fn in args.layer]
+            handles = []
+            for ii, layer in enumerate(layers):
+                color = args.colors[ii % len(args.colors)]
+                geom_type = layer.geom_type.iloc[0] if len(layer) > 0 else 'Polygon'
+                if 'Point' in geom_type:
+                    handles += ax.plot(layer.geometry.x, layer.geometry.y, 'o', color=color, ms=4, transform=myCRS)
+                elif 'Line' in geom_type:
+                    ax.add_feature(ShapelyFeature(layer['geometry'], myCRS, edgecolor=color, facecolor='none',
+                                                  linewidth=0.5))
+                    handles.append(mlines.Line2D([], [], color=color))
+                else:
+                    ax.add_feature(ShapelyFeature(layer['geometry'], myCRS, edgecolor='k', facecolor=color,
+                                                  linewidth=0.5, alpha=0.25))
+                    handles += generate_handles([labels[ii]], [color], alpha=0.25)
+
+            if len(handles) > 0:
+                ax.legend(handles, labels, title='Map Legend', title_fontsize=12, fontsize=10, loc='upper left',
+                          frameon=True, framealpha=1)
+            scale_bar(ax)
+
+        with stage('map: savefig'):
+            fig.savefig(args.output, bbox_inches='tight', dpi=args.dpi)
+    finally:
+        plt.close(fig)
+
+
+def run_zonal(args):
+    '''
+    Count the landcover (or other categorical raster) pixels in each zone, and save a table of the counts, areas,
+    and percentages as a CSV.
+    '''
+    import rasterio as rio
+    from map_tools import count_unique, landcover_names, landcover_table
+
+    with stage('zonal: read raster') as rec, rio.open(args.raster) as dataset:
+        landcover = dataset.read(1)
+        affine_tfm = dataset.transform
+        crs = dataset.crs
+        rec['rows'] = landcover.size
+
+    if args.zones is None:
+        with stage('zonal: count_unique', rows=landcover.size):
+            zone_stats = [count_unique(landcover, landcover_names, nodata=args.nodata)]
+            index = None
+    else:
+        import rasterstats
+
+        with stage('zonal: load zones') as rec:
+            zones = read_layer(args.zones).to_crs(crs)
+            rec['rows'] = len(zones)
+
+        with stage('zonal: zonal_stats', rows=len(zones)):
+            zone_stats = rasterstats.zonal_stats(zones, landcover, affine=affine_tfm, categorical=True,
+                                                 category_map=landcover_names, nodata=args.nodata)
+            index = zones[args.field] if args.field else None
+
+    with stage('zonal: landcover_table', rows=len(zone_stats)):
+        table = landcover_table(zone_stats, landcover_names, affine_tfm=affine_tfm, index=index)
+
+    table.to_csv(args.out)
+
+
+def run_nearest(args):
+    '''
+    Find the nearest target (e.g., train station) to each feature, and save the name and distance as a CSV.
+    '''
+    import pandas as pd
+    import geopandas as gpd
+
+    with stage('nearest: load data') as rec:
+        points = read_layer(args.points, x=args.x, y=args.y, crs=args.csv_crs).to_crs(epsg=args.epsg)
+        targets = read_layer(args.targets, x=args.x, y=args.y, crs=args.csv_crs).to_crs(epsg=args.epsg)
+        rec['rows'] = len(points) + len(targets)
+
+    with stage('nearest: sjoin_nearest', rows=len(points)):
+        # as in Week3/setup/aggregate_data.py, we find the closest target to the centroid of each feature
+        centroids = gpd.GeoDataFrame(geometry=points.centroid, crs=points.crs)
+        nearest = gpd.sjoin_nearest(centroids, targets[[args.target_field, 'geometry']], distance_col='Distance')
+        nearest = nearest[~nearest.index.duplicated()]  # if there is a tie, only keep the first target
+
+    output = pd.DataFrame(points.drop(columns='geometry'))
+    output['Nearest'] = nearest[args.target_field].str.title()
+    output['Distance'] = (nearest['Distance'] / 1000).round(2)  # distance in km, not m
+    output.to_csv(args.out, index=False)
+
+
+def run_stretch(args):
+    '''
+    Save a percentile-stretched display of a multi-band raster as an image.
+    '''
+    import matplotlib.pyplot as plt
+    import rasterio as rio
+    from map_tools import img_display
+
+    with stage('stretch: read raster') as rec, rio.open(args.raster) as dataset:
+        img = dataset.read()
+        xmin, ymin, xmax, ymax = dataset.bounds
+        rec['rows'] = img.size
+
+    fig, ax = plt.subplots(1, 1, figsize=(10, 10))
+    try:
+        with stage('stretch: img_display', rows=img.size):
+            img_display(img, ax, args.bands, stretch_args={'pmin': args.pmin, 'pmax': args.pmax},
+                        extent=[xmin, xmax, ymin, ymax])
+            ax.set_axis_off()
+
+        with stage('stretch: savefig'):
+            fig.savefig(args.output, bbox_inches='tight', dpi=args.dpi)
+    finally:
+        plt.close(fig)
+
+
+def build_parser():
+    '''
+    Create the argument parser for the command line, with one sub-parser per workflow.
+    '''
+    parser = argparse.ArgumentParser(description='Run the EGM722 map and analysis workflows.')
+    parser.add_argument('--batch', default=None,
+                        help='a file with one job (subcommand and arguments) per line, or - to read from stdin')
+    parser.add_argument('--trace', default=None, help='save a Chrome trace of the run to this file')
+    subparsers = parser.add_subparsers(dest='command')
+
+    map_parser = subparsers.add_parser('map', help='draw a map of vector layers')
+    map_parser.add_argument('output', help='the filename of the map to save')
+    map_parser.add_argument('--outline', required=True, help='the layer to use as the map background/extent')
+    map_parser.add_argument('--layer', action='append', default=[], help='a layer to add to the map (repeatable)')
+    map_parser.add_argument('--labels', nargs='+', default=None, help='the legend labels for the layers')
+    map_parser.add_argument('--colors', nargs='+', default=['firebrick', 'seagreen', 'royalblue', 'coral'],
+                            help='the colors to use for the layers')
+    map_parser.add_argument('--utm-zone', type=int, default=29, help='the UTM zone to draw the map in')
+    map_parser.add_argument('--dpi', type=int, default=300)
+    map_parser.set_defaults(func=run_map)
+
+    zonal_parser = subparsers.add_parser('zonal', help='tabulate categorical raster values in zones')
+    zonal_parser.add_argument('raster', help='the categorical (landcover) raster')
+    zonal_parser.add_argument('--zones', default=None, help='the polygon layer of zones. If not given, the whole '
+                                                            'raster is counted.')
+    zonal_parser.add_argument('--field', default=None, help='the zone attribute to use as the table index')
+    zonal_parser.add_argument('--nodata', type=int, default=0)
+    zonal_parser.add_argument('--out', default='zonal_stats.csv', help='the filename of the CSV table to save')
+    zonal_parser.set_defaults(func=run_zonal)
+
+    nearest_parser = subparsers.add_parser('nearest', help='find the nearest target to each feature')
+    nearest_parser.add_argument('points', help='the features (or CSV of points) to find the nearest target for')
+    nearest_parser.add_argument('targets', help='the targets (or CSV of points), e.g. train stations')
+    nearest_parser.add_argument('--target-field', default='Station', help='the name attribute of the targets')
+    nearest_parser.add_argument('--x', default='Easting', help='the x coordinate column of any CSV inputs')
+    nearest_parser.add_argument('--y', default='Northing', help='the y coordinate column of any CSV inputs')
+    nearest_parser.add_argument('--csv-crs', default='epsg:29902', help='the CRS of any CSV inputs')
+    nearest_parser.add_argument('--epsg', type=int, default=2157, help='the (projected) CRS to measure distances in')
+    nearest_parser.add_argument('--out', default='nearest.csv', help='the filename of the CSV table to save')
+    nearest_parser.set_defaults(func=run_nearest)
+
+    stretch_parser = subparsers.add_parser('stretch', help='save a percentile-stretched display of a raster')
+    stretch_parser.add_argument('raster', help='the multi-band raster to display')
+    stretch_parser.add_argument('output', help='the filename of the image to save')
+    stretch_parser.add_argument('--bands', type=int, nargs=3, default=[2, 1, 0],
+                                help='the (0-based) bands to display as red, green, blue')
+    stretch_parser.add_argument('--pmin', type=float, default=0.1)
+    stretch_parser.add_argument('--pmax', type=float, default=99.9)
+    stretch_parser.add_argument('--dpi', type=int, default=300)
+    stretch_parser.set_defaults(func=run_stretch)
+
+    return parser
+
+
+def parse_args(parser, argv=None):
+    '''
+    Parse the arguments for one run/job, and check any arguments that depend on each other.
+
+    :param parser: the argument parser, from build_parser()
+    :param argv: the list of arguments to parse. If None, sys.argv is used.
+
+    :returns: the parsed arguments
+    '''
+    args = parser.parse_args(argv)
+    if args.command == 'map' and args.labels is not None and len(args.labels) != len(args.layer):
+        parser.error('map: got {} --labels for {} --layer arguments; give one label for each layer'.format(
+            len(args.labels), len(args.layer)))
+    return args
+
+
+def run_batch(parser, lines):
+    '''
+    Run each job in a list of lines, in the same interpreter. Blank lines and lines starting with # are ignored.
+
+    A failed job is reported, but doesn't stop the rest of the jobs from running.
+
+    :param parser: the argument parser to use for each job
+    :param lines: the jobs to run, one subcommand and its arguments per line
+
+    :returns: the number of jobs that failed
+    '''
+    nfailed = 0
+    for lineno, line in enumerate(lines, 1):
+        if line.strip() == '' or line.strip().startswith('#'):
+            continue
+        try:
+            args = parse_args(parser, shlex.split(line))
+            if args.command is None:
+                raise ValueError('no subcommand given')
+            with stage('job {}: {}'.format(lineno, args.command)):
+                args.func(args)
+        except SystemExit:  # argparse exits on bad arguments; in a batch, we just count it as a failure
+            nfailed += 1
+            print('job {} failed: could not parse "{}"'.format(lineno, line.strip()), file=sys.stderr)
+        except Exception as e:
+            nfailed += 1
+            print('job {} failed: {}: {}'.format(lineno, type(e).__name__, e), file=sys.stderr)
+    return nfailed
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parse_args(parser, argv)
+
+    if args.batch is not None:
+        if args.batch == '-':
+            nfailed = run_batch(parser, sys.stdin.readlines())
+        else:
+            with open(args.batch, 'r') as f:
+                nfailed = run_batch(parser, f.readlines())
+        status = 1 if nfailed > 0 else 0
+    elif args.command is None:
+        parser.print_help()
+        status = 2
+    else:
+        args.func(args)
+        status = 0
+
+    if args.trace is not None:
+        report(args.trace)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,240 @@
+'''
+Bin points and raster pixels into a regular grid of square or hexagonal cells.
+
+Instead of creating a polygon grid and using gpd.sjoin() (as in Week3/exercise_script.py), the cell that each point or
+pixel falls in is found arithmetically from its coordinates. Each cell is identified by its (column, row) index, packed
+into a single integer id, so that points and rasters binned with the same size and origin share the same cell ids.
+Cell polygons are only created at the end (with cell_polygons()), for the cells that are actually needed to save or
+plot the results, e.g. with ShapelyFeature or GeoDataFrame.explore().
+
+All coordinates should be in the same projected CRS (e.g., UTM zone 29N, EPSG:32629), with cell sizes in meters.
+'''
+import numpy as np
+
+
+SQRT3 = np.sqrt(3)
+
+
+def encode_cells(col, row):
+    '''
+    Pack (column, row) cell indices into single int64 cell ids.
+
+    :param col: an array of column indices
+    :param row: an array of row indices
+
+    :returns: an array of cell ids
+    '''
+    return (np.asarray(row, dtype=np.int64) << 32) | (np.asarray(col, dtype=np.int64) & 0xFFFFFFFF)
+
+
+def decode_cells(cell_id):
+    '''
+    Unpack int64 cell ids into (column, row) cell indices.
+
+    :param cell_id: an array of cell ids
+
+    :returns col, row: arrays of the column and row indices
+    '''
+    cell_id = np.asarray(cell_id, dtype=np.int64)
+    return (cell_id & 0xFFFFFFFF).astype(np.uint32).view(np.int32).astype(np.int64), cell_id >> 32
+
+
+def square_cells(x, y, size, origin=(0, 0)):
+    '''
+    Find the (column, row) index of the square cell that each x, y location falls in.
+
+    :param x: an array of x coordinates
+    :param y: an array of y coordinates
+    :param size: the side length of each cell
+    :param origin: the (x, y) location of the lower left corner of cell (0, 0)
+
+    :returns col, row: arrays of the column and row indices
+    '''
+    col = np.floor((np.asarray(x) - origin[0]) / size).astype(np.int64)
+    row = np.floor((np.asarray(y) - origin[1]) / size).astype(np.int64)
+    return col, row
+
+
+def hex_cells(x, y, size, origin=(0, 0)):
+    '''
+    Find the axial (q, r) index of the pointy-topped hexagonal cell that each x, y location falls in.
+
+    See https://www.redblobgames.com/grids/hexagons/ for an explanation of axial coordinates and cube rounding.
+
+    :param x: an array of x coordinates
+    :param y: an array of y coordinates
+    :param size: the side length of each hexagon (the distance from the center to each corner)
+    :param origin: the (x, y) location of the center of cell (0, 0)
+
+    :returns q, r: arrays of the axial column and row indices
+    '''
+    x = (np.asarray(x, dtype=np.float64) - origin[0]) / size
+    y = (np.asarray(y, dtype=np.float64) - origin[1]) / size
+
+    qf = SQRT3 / 3 * x - y / 3
+    rf = 2 / 3 * y
+    sf = -qf - rf
+
+    # round each cube coordinate, then fix whichever one was rounded the most so that q + r + s = 0
+    q, r, s = np.round(qf), np.round(rf), np.round(sf)
+    dq, dr, ds = np.abs(q - qf), np.abs(r - rf), np.abs(s - sf)
+
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    q = np.where(fix_q, -r - s, q)
+    r = np.where(fix_r, -q - s, r)
+
+    return q.astype(np.int64), r.astype(np.int64)
+
+
+def cell_ids(x, y, size, kind='hex', origin=(0, 0)):
+    '''
+    Find the id of the (square or hexagonal) cell that each x, y location falls in.
+
+    :param x: an array of x coordinates
+    :param y: an array of y coordinates
+    :param size: the side length of each cell
+    :param kind: the kind of grid, either 'hex' or 'square'
+    :param origin: the origin of the grid (see square_cells() and hex_cells())
+
+    :returns: an array of cell ids
+    '''
+    if kind == 'hex':
+        return encode_cells(*hex_cells(x, y, size, origin))
+    elif kind == 'square':
+        return encode_cells(*square_cells(x, y, size, origin))
+    raise ValueError("kind must be one of 'hex', 'square'")
+
+
+def bin_points(points, size, kind='hex', origin=(0, 0), columns=None):
+    '''
+    Count the points in each cell, and (optionally) sum attribute values for each cell.
+
+    :param points: a GeoDataFrame of points
+    :param size: the side length of each cell
+    :param kind: the kind of grid, either 'hex' or 'square'
+    :param origin: the origin of the grid
+    :param columns: a list of numeric columns of points to sum within each cell
+
+    :returns: a pandas DataFrame indexed by cell id, with a 'count' column and one column for each of columns
+    '''
+    import pandas as pd
+
+    ids = cell_ids(points.geometry.x.to_numpy(), points.geometry.y.to_numpy(), size, kind=kind, origin=origin)
+    cells, inverse = np.unique(ids, return_inverse=True)
+
+    table = pd.DataFrame({'count': np.bincount(inverse, minlength=len(cells))}, index=pd.Index(cells, name='cell'))
+    for col in columns or []:
+        table[col] = np.bincount(inverse, weights=points[col].to_numpy(dtype=np.float64), minlength=len(cells))
+    return table
+
+
+def bin_raster(array, affine_tfm, size, names, kind='hex', origin=(0, 0), nodata=0, chunk_rows=256):
+    '''
+    Count the pixels of each class (e.g., landcover) in each cell, using the center of each pixel.
+
+    The raster is handled in blocks of chunk_rows rows at a time, so that the per-pixel cell ids never need to be
+    created for the whole raster at once.
+
+    :param array: a 2-dimensional array of (integer) class values
+    :param affine_tfm: the affine transformation of the raster. It must not be rotated.
+    :param size: the side length of each cell
+    :param names: a dict of key/value pairs that map raster values to a name
+    :param kind: the kind of grid, either 'hex' or 'square'
+    :param origin: the origin of the grid
+    :param nodata: the nodata value to ignore
+    :param chunk_rows: the number of rows of the raster to handle at once
+
+    :returns: a pandas DataFrame indexed by cell id, with one column of counts for each class in names
+    '''
+    import pandas as pd
+
+    if affine_tfm.b != 0 or affine_tfm.d != 0:
+        raise ValueError('rotated rasters are not supported')
+
+    # a lookup table from raster value to the column of the output table, with -1 for values we don't count
+    values = np.array(list(names.keys()), dtype=np.int64)
+    lookup = np.full(max(values.max(), np.max(array), 0) + 1, -1, dtype=np.int64)
+    lookup[values] = np.arange(len(values))
+    if 0 <= nodata < len(lookup):
+        lookup[nodata] = -1
+
+    nrows, ncols = array.shape
+    xs = affine_tfm.c + (np.arange(ncols) + 0.5) * affine_tfm.a  # the x coordinate of each pixel center
+    if kind == 'square':
+        col, _ = square_cells(xs, np.zeros(ncols), size, origin)
+
+    partials = []
+    for r0 in range(0, nrows, chunk_rows):
+        block = array[r0:r0 + chunk_rows]
+        ys = affine_tfm.f + (np.arange(r0, r0 + block.shape[0]) + 0.5) * affine_tfm.e
+
+        if kind == 'square':  # rows and columns of cells are independent, so we can just broadcast them
+            _, row = square_cells(np.zeros(len(ys)), ys, size, origin)
+            ids = encode_cells(col[np.newaxis, :], row[:, np.newaxis])
+        else:
+            ids = cell_ids(xs[np.newaxis, :], ys[:, np.newaxis], size, kind=kind, origin=origin)
+
+        block = block.astype(np.int64)
+        classes = np.where(block >= 0, lookup[np.clip(block, 0, None)], -1)
+        valid = classes >= 0
+        if not valid.any():
+            continue
+
+        cells, inverse = np.unique(ids[valid], return_inverse=True)
+        counts = np.bincount(inverse * len(values) + classes[valid], minlength=len(cells) * len(values))
+        partials.append(pd.DataFrame(counts.reshape(-1, len(values)), index=cells, columns=list(names.values())))
+
+    if len(partials) == 0:
+        return pd.DataFrame(columns=list(names.values()), index=pd.Index([], name='cell'), dtype=np.int64)
+
+    # cells that straddle two blocks will appear in both, so we add them together
+    table = pd.concat(partials).groupby(level=0).sum()
+    table.index.name = 'cell'
+    return table
+
+
+def cell_centers(cells, size, kind='hex', origin=(0, 0)):
+    '''
+    Get the x, y location of the center of each cell.
+
+    :param cells: an array of cell ids
+    :param size: the side length of each cell
+    :param kind: the kind of grid, either 'hex' or 'square'
+    :param origin: the origin of the grid
+
+    :returns x, y: arrays of the x and y coordinates of the cell centers
+    '''
+    col, row = decode_cells(cells)
+    if kind == 'hex':
+        return origin[0] + size * SQRT3 * (col + row / 2), origin[1] + size * 1.5 * row
+    elif kind == 'square':
+        return origin[0] + size * (col + 0.5), origin[1] + size * (row + 0.5)
+    raise ValueError("kind must be one of 'hex', 'square'")
+
+
+def cell_polygons(table, size, kind='hex', origin=(0, 0), crs=None):
+    '''
+    Create the polygons for the cells in a binned table, e.g. to plot with ShapelyFeature or explore().
+
+    :param table: a pandas DataFrame indexed by cell id (e.g., from bin_points() or bin_raster())
+    :param size: the side length of each cell
+    :param kind: the kind of grid, either 'hex' or 'square'
+    :param origin: the origin of the grid
+    :param crs: the CRS of the grid
+
+    :returns: a GeoDataFrame with the same index and columns as table, and the cell polygons as the geometry
+    '''
+    import shapely
+    import geopandas as gpd
+
+    cx, cy = cell_centers(table.index.to_numpy(), size, kind=kind, origin=origin)
+    if kind == 'hex':
+        angles = np.deg2rad(30 + 60 * np.arange(7))  # the corners of a pointy-topped hexagon, closing the ring
+        dx, dy = size * np.cos(angles), size * np.sin(angles)
+    else:
+        dx = size / 2 * np.array([-1, 1, 1, -1, -1])
+        dy = size / 2 * np.array([-1, -1, 1, 1, -1])
+
+    rings = np.stack([cx[:, np.newaxis] + dx, cy[:, np.newaxis] + dy], axis=-1)
+    return gpd.GeoDataFrame(table, geometry=shapely.polygons(rings), crs=crs)
@@ -0,0 +1,212 @@
+'''
+The helper functions from the practicals (Week2/practical2_script.py, Week4/assignment_script.py, and
+Week5/Practical5.ipynb), collected in one place. The scripts import them from here, so that the benchmarks and the
+command-line tool run the same code as the workflows.
+'''
+import numpy as np
+
+
+# the class names for the LCM2015 aggregate landcover classes (Week5/data_files/LCM2015_Aggregate_100m.tif)
+landcover_names = {1: 'Broadleaf woodland',
+                   2: 'Coniferous woodland',
+                   3: 'Arable',
+                   4: 'Improved grassland',
+                   5: 'Semi-natural grassland',
+                   6: 'Mountain, heath, bog',
+                   7: 'Saltwater',
+                   8: 'Freshwater',
+                   9: 'Coastal',
+                   10: 'Built-up areas and gardens'}
+
+
+def generate_handles(labels, colors, edge='k', alpha=1):
+    '''
+    Generate matplotlib patch handles to create a legend of the features we put in our map.
+
+    :param labels: a list of labels, one for each handle
+    :param colors: a list of colors to use for the handles. If there are fewer colors than labels, the colors repeat.
+    :param edge: the edge color to use for the handles
+    :param alpha: the transparency to use for the handles
+
+    :returns handles: a list of matplotlib.patches.Rectangle objects
+    '''
+    import matplotlib.patches as mpatches
+
+    lc = len(colors)  # get the length of the color list
+    handles = []
+    for i in range(len(labels)):
+        handles.append(mpatches.Rectangle((0, 0), 1, 1, facecolor=colors[i % lc], edgecolor=edge, alpha=alpha))
+    return handles
+
+
+# scale bar adapted from this question: https://stackoverflow.com/q/32333870
+# answered by SO user Siyh: https://stackoverflow.com/a/35705477
+def scale_bar(ax, location=(0.92, 0.95)):
+    '''
+    Add a 20 km scale bar to a map.
+
+    :param ax: the cartopy GeoAxes to add the scale bar to. The projection must have units of meters.
+    :param location: the (x, y) location of the right end of the scale bar, as a fraction of the axis extent
+    '''
+    x0, x1, y0, y1 = ax.get_extent()
+    sbx = x0 + (x1 - x0) * location[0]
+    sby = y0 + (y1 - y0) * location[1]
+
+    ax.plot([sbx, sbx - 20000], [sby, sby], color='k', linewidth=9, transform=ax.projection)
+    ax.plot([sbx, sbx - 10000], [sby, sby], color='k', linewidth=6, transform=ax.projection)
+    ax.plot([sbx-10000, sbx - 20000], [sby, sby], color='w', linewidth=6, transform=ax.projection)
+
+    ax.text(sbx, sby-4500, '20 km', transform=ax.projection, fontsize=8)
+    ax.text(sbx-12500, sby-4500, '10 km', transform=ax.projection, fontsize=8)
+    ax.text(sbx-24500, sby-4500, '0 km', transform=ax.projection, fontsize=8)
+
+
+def percentile_stretch(img, pmin=0., pmax=100.):
+    '''
+    Contrast stretch a single-band image to 0, 1 using percentiles.
+
+    Anything below the pmin percentile is set to 0, and anything above the pmax percentile is set to 1.
+
+    :param img: the 2-dimensional image to stretch
+    :param pmin: the lower percentile. Must be between 0 and 100, and smaller than pmax.
+    :param pmax: the upper percentile. Must be between 0 and 100, and larger than pmin.
+
+    :returns stretched: the stretched image
+    '''
+    # here, we make sure that pmin < pmax, and that they are between 0, 100
+    if not 0 <= pmin < pmax <= 100:
+        raise ValueError('0 <= pmin < pmax <= 100')
+    # here, we make sure that the image is only 2-dimensional
+    if not img.ndim == 2:
+        raise ValueError('Image can only have two dimensions (row, column)')
+
+    minval = np.percentile(img, pmin)
+    maxval = np.percentile(img, pmax)
+
+    stretched = (img - minval) / (maxval - minval)  # stretch the image to 0, 1
+    stretched[img < minval] = 0  # set anything less than minval to the new minimum, 0.
+    stretched[img > maxval] = 1  # set anything greater than maxval to the new maximum, 1.
+
+    return stretched
+
+
+def img_display(img, ax, bands, stretch_args=None, **imshow_args):
+    '''
+    Display a multi-band raster image, stretching each band with percentile_stretch().
+
+    :param img: the image to display, with shape (band, row, column)
+    :param ax: the matplotlib axis to display the image in
+    :param bands: the list of (three) bands to display as red, green, blue
+    :param stretch_args: a dict of arguments to pass to percentile_stretch(). If None, the defaults are used.
+    :param imshow_args: any additional arguments to pass to ax.imshow()
+
+    :returns handle, ax: the handle of the displayed image, and the axis
+    '''
+    dispimg = img.copy().astype(np.float32)  # make a copy of the original image,
+    # but be sure to cast it as a floating-point image, rather than an integer
+
+    for b in range(img.shape[0]):  # loop over each band, stretching using percentile_stretch()
+        if stretch_args is None:  # if stretch_args is None, use the default values for percentile_stretch
+            dispimg[b] = percentile_stretch(img[b])
+        else:
+            dispimg[b] = percentile_stretch(img[b], **stretch_args)
+
+    # next, we transpose the image to re-order the indices
+    dispimg = dispimg.transpose([1, 2, 0])
+
+    # finally, we display the image
+    handle = ax.imshow(dispimg[:, :, bands], **imshow_args)
+
+    return handle, ax
+
+
+def count_unique(array, names, nodata=0):
+    '''
+    Count the unique elements of an array.
+
+    :param array: Input array
+    :param names: a dict of key/value pairs that map raster values to a name
+    :param nodata: nodata value to ignore in the counting
+
+    :returns count_dict: a dictionary of unique values and counts
+    '''
+    count_dict = dict()  # create the output dict
+    for val in np.unique(array):  # iterate over the unique values for the raster
+        if val == nodata:  # if the value is equal to our nodata value, move on to the next one
+            continue
+        count_dict[names[val]] = np.count_nonzero(array == val)
+    return count_dict  # return the now-populated output dict
+
+
+def count_matrix(zone_stats, names):
+    '''
+    Convert the list of categorical dicts from rasterstats.zonal_stats() into a (zone x class) array of counts.
+
+    Classes that are missing from a zone are given a count of 0. Each class can be keyed by either its raster value
+    or its name (if category_map was used), and the two can be mixed between (or within) zones.
+
+    :param zone_stats: a list of dicts of class/count pairs, one for each zone
+    :param names: a dict of key/value pairs that map raster values to a name
+
+    :returns counts: an array of counts, with one row per zone and one column per class in names
+    '''
+    import pandas as pd
+
+    # the column of the output for each class, whether it is keyed by raster value or by name
+    lookup = {val: ii for ii, val in enumerate(names.keys())}
+    lookup.update({name: ii for ii, name in enumerate(names.values())})
+
+    table = pd.DataFrame.from_records(zone_stats)
+    unknown = [key for key in table.columns if key not in lookup]
+    if len(unknown) > 0:  # rather than silently dropping the counts for these classes
+        raise ValueError('zone_stats has classes that are not in names: {}'.format(unknown))
+
+    counts = np.zeros((len(zone_stats), len(names)), dtype=np.int64)
+    for key in table.columns:
+        counts[:, lookup[key]] += table[key].fillna(0).to_numpy(dtype=np.int64)
+    return counts
+
+
+def landcover_table(counts, names, affine_tfm=None, index=None, short_names=None):
+    '''
+    Build a wide table of the count, area, and percentage of each class in each zone.
+
+    The columns are in the same order as names: first the counts, then the areas in km2 (if affine_tfm is given),
+    with a suffix of _km2, then the percentage of each zone covered by each class, with a suffix of _pc.
+
+    :param counts: a (zone x class) array, nested list, or DataFrame of counts, or the list of dicts from
+        rasterstats.zonal_stats()
+    :param names: a dict of key/value pairs that map raster values to a name
+    :param affine_tfm: the affine transformation of the raster, used to get the pixel area
+    :param index: the index (e.g., county names) to use for the table
+    :param short_names: a list of (short) column names to use, one for each class in names
+
+    :returns table: a pandas DataFrame with one row per zone
+    '''
+    import pandas as pd
+
+    if isinstance(counts, (list, tuple)) and all(isinstance(zone, dict) for zone in counts):
+        counts = count_matrix(counts, names)
+    elif isinstance(counts, pd.DataFrame):
+        counts = counts.to_numpy()
+    else:
+        counts = np.asarray(counts)
+
+    if counts.ndim != 2 or counts.shape[1] != len(names):
+        raise ValueError('counts must be a (zone x class) array, with one column for each class in names')
+    if short_names is not None and len(short_names) != len(names):
+        raise ValueError('short_names must have one name for each class in names')
+
+    cols = list(short_names or names.values())
+    blocks = [pd.DataFrame(counts, columns=cols, index=index)]
+
+    if affine_tfm is not None:
+        pixel_area = abs(affine_tfm.a * affine_tfm.e - affine_tfm.b * affine_tfm.d) / 1e6  # pixel size in km2
+        blocks.append(pd.DataFrame(counts * pixel_area, columns=[c + '_km2' for c in cols], index=index))
+
+    totals = counts.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        percent = np.where(totals > 0, 100 * counts / totals, 0.)  # a zone with no valid pixels gets 0, not NaN
+    blocks.append(pd.DataFrame(percent, columns=[c + '_pc' for c in cols], index=index))
+
+    return pd.concat(blocks, axis=1)
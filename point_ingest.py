@@ -0,0 +1,202 @@
+'''
+Columnar ingestion of point tables (e.g., translink-stationsni.csv, Airports.csv, GPSPoints.txt).
+
+Rather than reading the whole table with pd.read_csv() and building one shapely Point per row, the functions here
+read the CSV in blocks using pyarrow's CSV reader, filter and reproject the coordinates as numpy arrays, and encode
+the geometries directly as WKB. That way, only one block is ever held in memory at a time.
+'''
+import json
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pcsv
+import pyarrow.parquet as pq
+from pyproj import CRS, Transformer
+
+
+# each WKB point is 21 bytes: byte order (1 = little endian), geometry type (1 = Point), then x, y as doubles
+WKB_POINT = np.dtype([('order', 'u1'), ('type', '<u4'), ('x', '<f8'), ('y', '<f8')])
+
+
+def _open_reader(fn_csv, x, y, columns, column_types, block_size):
+    '''
+    Open a streaming pyarrow CSV reader for a table of point locations, with x and y read as float64.
+    '''
+    types = dict(column_types or {})
+    types.update({x: pa.float64(), y: pa.float64()})
+
+    include = None
+    if columns is not None:
+        include = [c for c in columns if c not in (x, y)] + [x, y]
+
+    return pcsv.open_csv(fn_csv,
+                         read_options=pcsv.ReadOptions(block_size=block_size),
+                         convert_options=pcsv.ConvertOptions(column_types=types, include_columns=include))
+
+
+def _filter_batches(reader, x, y, crs, to_crs, bbox, out_xy):
+    '''
+    Filter (by bbox) and reproject each batch from an open CSV reader.
+    '''
+    transformer = None
+    if to_crs is not None:
+        transformer = Transformer.from_crs(crs, to_crs, always_xy=True)
+        if any(name in reader.schema.names for name in out_xy):
+            raise ValueError('out_xy columns {} are already in the CSV'.format(out_xy))
+
+    for batch in reader:
+        xs = batch.column(x).to_numpy(zero_copy_only=False)
+        ys = batch.column(y).to_numpy(zero_copy_only=False)
+
+        if bbox is not None:
+            xmin, ymin, xmax, ymax = bbox
+            inside = (xs >= xmin) & (xs <= xmax) & (ys >= ymin) & (ys <= ymax)
+            if not inside.any():  # nothing in this block, so we can move on to the next one
+                continue
+            if not inside.all():
+                batch = batch.filter(pa.array(inside))
+                xs, ys = xs[inside], ys[inside]
+
+        if transformer is not None:
+            # the x, y columns keep the original coordinates, so the new ones get their own names
+            xs, ys = transformer.transform(xs, ys)
+            batch = batch.append_column(out_xy[0], pa.array(xs)).append_column(out_xy[1], pa.array(ys))
+
+        yield batch
+
+
+def iter_point_batches(fn_csv, x='Easting', y='Northing', columns=None, column_types=None, crs='epsg:29902',
+                       to_crs=None, bbox=None, block_size=16 << 20, out_xy=('x', 'y')):
+    '''
+    Read a CSV of point locations in blocks, yielding one pyarrow RecordBatch per block.
+
+    Each batch has the attribute columns that were asked for, plus the original x and y coordinates. If to_crs is
+    given, the reprojected coordinates are added as two new columns, named by out_xy. Blocks where no rows fall inside
+    of bbox are skipped entirely.
+
+    :param fn_csv: the filename of the CSV to read
+    :param x: the name of the column with the x coordinate (easting/longitude)
+    :param y: the name of the column with the y coordinate (northing/latitude)
+    :param columns: a list of the attribute columns to keep. If None, all columns are kept.
+    :param column_types: a dict of column name/pyarrow type pairs. x and y are always read as float64.
+    :param crs: the CRS of the coordinates in the CSV
+    :param to_crs: the CRS to transform the coordinates to. If None, the coordinates are not transformed.
+    :param bbox: (xmin, ymin, xmax, ymax) of the area to keep, in the same CRS as the CSV.
+    :param block_size: the number of bytes to read from the CSV at once
+    :param out_xy: the names of the columns for the reprojected x and y coordinates, if to_crs is given
+
+    :returns: a generator of pyarrow.RecordBatch objects
+    '''
+    reader = _open_reader(fn_csv, x, y, columns, column_types, block_size)
+    yield from _filter_batches(reader, x, y, crs, to_crs, bbox, out_xy)
+
+
+def points_to_wkb(xs, ys):
+    '''
+    Encode arrays of x, y coordinates as an arrow array of WKB points, without creating any shapely objects.
+
+    :param xs: an array of x coordinates
+    :param ys: an array of y coordinates
+
+    :returns: a pyarrow.BinaryArray of WKB-encoded points
+    '''
+    npts = len(xs)
+    wkb = np.empty(npts, dtype=WKB_POINT)
+    wkb['order'] = 1
+    wkb['type'] = 1
+    wkb['x'] = xs
+    wkb['y'] = ys
+
+    offsets = np.arange(0, (npts + 1) * WKB_POINT.itemsize, WKB_POINT.itemsize, dtype=np.int32)
+    return pa.Array.from_buffers(pa.binary(), npts, [None, pa.py_buffer(offsets), pa.py_buffer(wkb.tobytes())])
+
+
+def geo_metadata(crs, geometry='geometry'):
+    '''
+    Create the GeoParquet 'geo' metadata for a table of WKB points.
+
+    :param crs: the CRS of the point geometries
+    :param geometry: the name of the geometry column
+
+    :returns: a dict with the 'geo' key and JSON-encoded metadata
+    '''
+    meta = {'version': '1.0.0',
+            'primary_column': geometry,
+            'columns': {geometry: {'encoding': 'WKB',
+                                   'geometry_types': ['Point'],
+                                   'crs': CRS.from_user_input(crs).to_json_dict()}}}
+    return {b'geo': json.dumps(meta).encode('utf-8')}
+
+
+def csv_to_geoparquet(fn_csv, fn_out, x='Easting', y='Northing', columns=None, column_types=None, crs='epsg:29902',
+                      to_crs=None, bbox=None, block_size=16 << 20, out_xy=('x', 'y'), keep_xy=False,
+                      compression='snappy'):
+    '''
+    Stream a CSV of point locations to a GeoParquet file, one row group per block of the CSV.
+
+    The arguments are the same as for iter_point_batches(); the output geometries are in to_crs (if given) or crs.
+
+    :param fn_csv: the filename of the CSV to read
+    :param fn_out: the filename of the GeoParquet file to write
+    :param keep_xy: whether to keep the x, y columns (and the reprojected out_xy columns, if to_crs is given) in the
+        output table as well as the geometry
+    :param compression: the compression to use for the parquet file
+
+    :returns: the number of points written to the output file
+    '''
+    reader = _open_reader(fn_csv, x, y, columns, column_types, block_size)
+
+    # build the output schema up front, so that we always write a file, even if no points fall inside of bbox
+    gx, gy = (x, y) if to_crs is None else out_xy  # the columns to take the output geometries from
+    schema = reader.schema
+    if to_crs is not None:
+        schema = schema.append(pa.field(gx, pa.float64())).append(pa.field(gy, pa.float64()))
+    if not keep_xy:
+        schema = pa.schema([field for field in schema if field.name not in (x, y, gx, gy)])
+    schema = schema.append(pa.field('geometry', pa.binary()))
+    schema = schema.with_metadata(geo_metadata(crs if to_crs is None else to_crs))
+
+    npts = 0
+    with pq.ParquetWriter(fn_out, schema, compression=compression) as writer:
+        for batch in _filter_batches(reader, x, y, crs, to_crs, bbox, out_xy):
+            geom = points_to_wkb(batch.column(gx).to_numpy(zero_copy_only=False),
+                                 batch.column(gy).to_numpy(zero_copy_only=False))
+            if not keep_xy:
+                batch = batch.drop_columns(list({x, y, gx, gy}))
+            table = pa.Table.from_batches([batch]).append_column('geometry', geom)
+
+            writer.write_table(table.replace_schema_metadata(schema.metadata))
+            npts += table.num_rows
+
+    return npts
+
+
+def read_points(fn_csv, x='Easting', y='Northing', columns=None, column_types=None, crs='epsg:29902',
+                to_crs=None, bbox=None, block_size=16 << 20, out_xy=('x', 'y')):
+    '''
+    Read a CSV of point locations into a GeoDataFrame, in place of pd.read_csv() + gpd.points_from_xy() + to_crs().
+
+    The arguments are the same as for iter_point_batches(). Note that this keeps the whole (filtered) table in memory;
+    for very large files, use csv_to_geoparquet() instead.
+
+    :returns: a GeoDataFrame of the points, in to_crs (if given) or crs
+    '''
+    import geopandas as gpd
+
+    gx, gy = (x, y) if to_crs is None else out_xy
+    reader = _open_reader(fn_csv, x, y, columns, column_types, block_size)
+    batches = list(_filter_batches(reader, x, y, crs, to_crs, bbox, out_xy))
+    if len(batches) == 0:
+        df = reader.schema.empty_table().to_pandas()
+        if to_crs is not None:
+            df[gx], df[gy] = np.empty(0), np.empty(0)
+        xs = ys = np.empty(0)
+    else:
+        table = pa.Table.from_batches(batches)
+        xs = table.column(gx).to_numpy()
+        ys = table.column(gy).to_numpy()
+        df = table.to_pandas()
+
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+
+    return gpd.GeoDataFrame(df, geometry=gpd.points_from_xy(xs, ys), crs=crs if to_crs is None else to_crs)
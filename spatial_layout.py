@@ -0,0 +1,137 @@
+'''
+Write vector layers (e.g., NI_roads.shp) in a spatially sorted layout, so that reading a single county or map extent
+only has to fetch the features that intersect it.
+
+Features are sorted along a Hilbert curve, so that features that are close together in space are also close together
+in the file. The layer is then saved as either:
+
+- GeoParquet (.parquet), with a bbox "covering" column and small row groups. Each row group stores the min/max of
+  the bbox column, so any row group that can't intersect the area of interest is skipped without being read.
+- FlatGeobuf (.fgb), which stores a packed Hilbert R-tree index of the feature bounding boxes.
+
+For example:
+
+    write_sorted('Week3/data_files/NI_roads.shp', 'NI_roads.parquet')
+    roads = read_extent('NI_roads.parquet', extent=ax.get_extent(), columns=['Road_class'])
+'''
+import os
+
+
+def _is_parquet(fn):
+    return os.path.splitext(fn)[1].lower() in ['.parquet', '.geoparquet']
+
+
+def hilbert_sort(gdf, level=16):
+    '''
+    Sort a GeoDataFrame along a Hilbert curve, using the center of each feature's bounding box.
+
+    :param gdf: the GeoDataFrame to sort
+    :param level: the level of the Hilbert curve. Higher levels give a finer ordering.
+
+    :returns: the sorted GeoDataFrame
+    '''
+    distance = gdf.geometry.hilbert_distance(total_bounds=gdf.total_bounds, level=level)
+    return gdf.iloc[distance.argsort(kind='stable')]
+
+
+def write_sorted(layer, fn_out, row_group_size=1000, level=16):
+    '''
+    Write a vector layer in Hilbert order as GeoParquet (with bbox columns) or FlatGeobuf (with a packed R-tree).
+
+    The output format is chosen from the extension of fn_out: .parquet for GeoParquet, .fgb for FlatGeobuf.
+
+    :param layer: a GeoDataFrame, or the filename of a vector layer to read
+    :param fn_out: the filename to write the sorted layer to
+    :param row_group_size: the number of features in each row group (GeoParquet only). Smaller row groups make
+        windowed reads more selective, at the cost of a slightly larger file.
+    :param level: the level of the Hilbert curve to sort with
+    '''
+    import geopandas as gpd
+
+    if isinstance(layer, str):
+        layer = gpd.read_file(layer)
+    layer = hilbert_sort(layer, level=level).reset_index(drop=True)
+
+    if _is_parquet(fn_out):
+        layer.to_parquet(fn_out, write_covering_bbox=True, row_group_size=row_group_size)
+    elif os.path.splitext(fn_out)[1].lower() == '.fgb':
+        layer.to_file(fn_out, driver='FlatGeobuf', SPATIAL_INDEX='YES')
+    else:
+        raise ValueError('fn_out must be a .parquet or .fgb file')
+
+
+def extent_to_bbox(extent):
+    '''
+    Convert a matplotlib/cartopy extent (xmin, xmax, ymin, ymax) to a bounding box (xmin, ymin, xmax, ymax).
+    '''
+    xmin, xmax, ymin, ymax = extent
+    return xmin, ymin, xmax, ymax
+
+
+def read_extent(fn, bbox=None, extent=None, mask=None, columns=None):
+    '''
+    Read only the features of a spatially sorted layer that intersect a bounding box, extent, or polygon.
+
+    Only one of bbox, extent, or mask should be given. With a bbox or extent, the features whose bounding boxes
+    intersect it are returned. With a mask, features are first selected using the mask's bounding box, and then only
+    the features that actually intersect the mask are kept; note that the features are not clipped to the mask.
+
+    :param fn: the filename of the layer written by write_sorted() (or any GeoParquet/FlatGeobuf file)
+    :param bbox: the (xmin, ymin, xmax, ymax) bounding box to read, in the CRS of the layer
+    :param extent: the (xmin, xmax, ymin, ymax) extent to read (e.g., as passed to ax.set_extent()),
+        in the CRS of the layer
+    :param mask: a shapely geometry, GeoSeries, or GeoDataFrame (e.g., a single county) to read the features of.
+        If both mask and the layer have a CRS, mask is transformed to the CRS of the layer.
+    :param columns: a list of the attribute columns to read. If None, all columns are read.
+
+    :returns: a GeoDataFrame of the selected features
+    '''
+    import geopandas as gpd
+
+    if sum(arg is not None for arg in [bbox, extent, mask]) > 1:
+        raise ValueError('only one of bbox, extent, or mask can be given')
+
+    if extent is not None:
+        bbox = extent_to_bbox(extent)
+
+    mask_geom = None
+    if mask is not None:
+        if hasattr(mask, 'crs') and mask.crs is not None:
+            layer_crs = _read_crs(fn)
+            if layer_crs is not None:  # if the layer has no CRS, we have to assume that mask is in the same one
+                mask = mask.to_crs(layer_crs)
+        mask_geom = mask.union_all() if hasattr(mask, 'union_all') else mask
+        bbox = mask_geom.bounds
+
+    if bbox is not None:
+        bbox = tuple(bbox)  # pyogrio only accepts a tuple, not (e.g.) the array from total_bounds
+
+    if _is_parquet(fn):
+        if columns is not None:
+            columns = list(columns) + ['geometry']
+        gdf = gpd.read_parquet(fn, columns=columns, bbox=bbox)
+    else:
+        gdf = gpd.read_file(fn, bbox=bbox, columns=columns)
+
+    if mask_geom is not None:
+        gdf = gdf.loc[gdf.intersects(mask_geom)]
+    return gdf
+
+
+def _read_crs(fn):
+    '''
+    Read the CRS of a layer, without reading any of its features.
+    '''
+    if _is_parquet(fn):
+        import json
+        import pyarrow.parquet as pq
+        from pyproj import CRS
+
+        geo = json.loads(pq.read_schema(fn).metadata[b'geo'])
+        crs = geo['columns'][geo['primary_column']].get('crs', 'OGC:CRS84')
+        if isinstance(crs, dict) and 'id' in crs:  # parsing the full PROJJSON is slow, so use the code if we can
+            crs = '{}:{}'.format(crs['id']['authority'], crs['id']['code'])
+        return None if crs is None else CRS.from_user_input(crs)
+
+    import pyogrio
+    return pyogrio.read_info(fn)['crs']
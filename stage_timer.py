@@ -0,0 +1,194 @@
+'''
+Lightweight stage timers for the load/analysis/render steps of the scripts in this repository.
+
+Each stage records the wall time, CPU time, the change in peak resident memory (RSS), and (optionally) the number of
+rows/vertices that it handled. The records can be printed as a summary table, or saved as a Chrome trace file that
+can be opened in chrome://tracing or https://ui.perfetto.dev.
+
+Timing a stage costs a few microseconds, so the timers can be left on; set the environment variable EGM722_PROFILE=0
+to turn them off entirely.
+'''
+import os
+import sys
+import json
+import time
+import functools
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # resource is not available on Windows, so we can't report peak memory there
+    resource = None
+
+
+# ru_maxrss is reported in bytes on macOS, but in kilobytes everywhere else
+_RSS_SCALE = 1 if sys.platform == 'darwin' else 1024
+
+
+def peak_rss():
+    '''
+    Get the peak resident memory of the current process, in bytes.
+
+    :returns: the peak RSS in bytes, or None if it can't be found on this platform
+    '''
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_SCALE
+
+
+def count_vertices(geoms):
+    '''
+    Count the total number of vertices (coordinates) in a collection of geometries.
+
+    :param geoms: a GeoSeries, GeoDataFrame, or array of shapely geometries
+
+    :returns: the number of vertices
+    '''
+    import shapely
+
+    if hasattr(geoms, 'geometry'):
+        geoms = geoms.geometry
+    return int(shapely.get_num_coordinates(getattr(geoms, 'values', geoms)).sum())
+
+
+class StageTimer:
+    '''
+    Collects the timing records for a (possibly nested) series of stages.
+    '''
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.records = []
+        self._depth = 0
+        self._t0 = time.perf_counter_ns()
+
+    @contextmanager
+    def stage(self, name, rows=None, vertices=None):
+        '''
+        Time a block of code as a named stage.
+
+        The record is yielded, so that counts that are only known at the end of the stage can be added
+        (e.g., rec['rows'] = len(join)).
+
+        :param name: the name of the stage
+        :param rows: the number of rows (features/pixels) handled by the stage
+        :param vertices: the number of vertices handled by the stage
+
+        :returns: the dict that holds the record for this stage
+        '''
+        rec = {'name': name, 'depth': self._depth, 'rows': rows, 'vertices': vertices}
+        if not self.enabled:
+            yield rec
+            return
+
+        rss0 = peak_rss()
+        cpu0 = time.process_time_ns()
+        wall0 = time.perf_counter_ns()
+        self._depth += 1
+        try:
+            yield rec
+        finally:
+            wall1 = time.perf_counter_ns()
+            cpu1 = time.process_time_ns()
+            rss1 = peak_rss()
+            self._depth -= 1
+
+            rec['start'] = (wall0 - self._t0) / 1e9
+            rec['wall'] = (wall1 - wall0) / 1e9
+            rec['cpu'] = (cpu1 - cpu0) / 1e9
+            rec['peak_rss_delta'] = None if rss0 is None else rss1 - rss0
+            self.records.append(rec)
+
+    def timed(self, name=None, rows=None):
+        '''
+        Decorator that times every call to a function as a stage.
+
+        :param name: the name of the stage. If None, the name of the function is used.
+        :param rows: a function that takes the return value and gives the number of rows, e.g., len
+
+        :returns: the decorated function
+        '''
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name or func.__name__) as rec:
+                    out = func(*args, **kwargs)
+                    if rows is not None:
+                        rec['rows'] = rows(out)
+                return out
+            return wrapper
+        return decorator
+
+    def summary(self):
+        '''
+        Create a summary table of the recorded stages, in the order that they started.
+
+        :returns: the summary table, as a string
+        '''
+        header = '{:<40}{:>10}{:>10}{:>12}{:>12}{:>12}'.format('stage', 'wall (s)', 'cpu (s)', 'rss (MB)',
+                                                            'rows', 'vertices')
+        lines = [header, '-' * len(header)]
+        for rec in sorted(self.records, key=lambda r: r['start']):
+            rss = rec['peak_rss_delta']
+            lines.append('{:<40}{:>10.3f}{:>10.3f}{:>12}{:>12}{:>12}'.format(
+                ('  ' * rec['depth'] + rec['name'])[:39], rec['wall'], rec['cpu'],
+                '-' if rss is None else '{:.1f}'.format(rss / 2**20),
+                '-' if rec['rows'] is None else rec['rows'],
+                '-' if rec['vertices'] is None else rec['vertices']))
+        return '\n'.join(lines)
+
+    def to_trace(self):
+        '''
+        Convert the recorded stages to the Chrome trace event format.
+
+        :returns: a dict that can be written to a JSON file and opened in chrome://tracing
+        '''
+        events = []
+        for rec in self.records:
+            args = {k: rec[k] for k in ['cpu', 'peak_rss_delta', 'rows', 'vertices'] if rec[k] is not None}
+            events.append({'name': rec['name'], 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                           'ts': rec['start'] * 1e6, 'dur': rec['wall'] * 1e6, 'args': args})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_trace(self, fn_out):
+        '''
+        Save the recorded stages as a Chrome trace JSON file.
+
+        :param fn_out: the filename to write the trace to
+        '''
+        with open(fn_out, 'w') as f:
+            json.dump(self.to_trace(), f)
+
+    def report(self, fn_trace=None, stream=sys.stderr):
+        '''
+        Print the summary table and (optionally) save the Chrome trace file.
+
+        :param fn_trace: the filename to write the trace to. If None, no trace file is written.
+        :param stream: where to print the summary table
+        '''
+        if not self.enabled or len(self.records) == 0:
+            return
+        print(self.summary(), file=stream)
+        if fn_trace is not None:
+            self.write_trace(fn_trace)
+
+
+# the default timer, shared by all of the scripts
+TIMER = StageTimer(enabled=os.environ.get('EGM722_PROFILE', '1') != '0')
+
+stage = TIMER.stage
+timed = TIMER.timed
+report = TIMER.report
+
+
+def vertices(*layers):
+    '''
+    Count the total number of vertices in one or more layers for a stage record, but only if the default timer is
+    enabled; counting the vertices of a large layer is not free, so we skip it when nothing will be recorded.
+
+    :param layers: the GeoSeries/GeoDataFrames (or arrays of shapely geometries) to count the vertices of
+
+    :returns: the number of vertices, or None if the default timer is disabled
+    '''
+    if not TIMER.enabled:
+        return None
+    return sum(count_vertices(layer) for layer in layers)